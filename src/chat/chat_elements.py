@@ -1,11 +1,33 @@
-from typing import Any, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 import panel as pn
 
 from run_time import BaseCodeRunTime
 from utils.parsers import MarkdownParser
 
-pn.extension("codeeditor", "plotly", "texteditor")
+__all__ = [
+    "BaseChatElement",
+    "TextCodeRow",
+    "PythonCodeBlock",
+    "PythonObjDescription",
+    "load_extensions",
+]
+
+_EXTENSIONS_LOADED = False
+
+
+def load_extensions() -> None:
+    """
+    Load the Panel extensions used by the chat elements, only the first time it is called.
+
+    The extensions are loaded when the first chat element is created instead of on import, applications should call
+    this before they are served so the extensions are part of the page.
+    """
+    global _EXTENSIONS_LOADED
+    if not _EXTENSIONS_LOADED:
+        pn.extension("codeeditor", "plotly", "texteditor")
+        _EXTENSIONS_LOADED = True
 
 
 class BaseChatElement(pn.Column):
@@ -15,6 +37,9 @@ class BaseChatElement(pn.Column):
 
     """
 
+    width_padding = 5
+    height_padding = 5
+
     def __init__(self):
         super().__init__()
 
@@ -34,6 +59,178 @@ class BaseChatElement(pn.Column):
         """
         return ""
 
+    def _iter_element_text(self, handlers: "ElementHandlers") -> Iterator[str]:
+        """
+        Iterate over the text of the elements, as given by their handlers.
+
+        Parameters
+        ----------
+        handlers : ElementHandlers
+            The handlers keyed by element type, elements without a handler are skipped.
+
+        Yields
+        ------
+        str
+            The text of each element that has a handler.
+        """
+        for element in self.objects:
+            handler = _get_handler(handlers, element)
+            if handler is not None:
+                yield handler(element)
+
+    def _get_code_size(self, code: str) -> Tuple[int, int]:
+        """
+        Get the size of the code block.
+
+        Parameters
+        ----------
+        code : str
+            The code block to get the size of.
+
+        Returns
+        -------
+        Tuple[int, int]
+            The width and height of the code block.
+        """
+        return _code_size(code, self.width_padding, self.height_padding)
+
+
+# Above this average line length, finding the newlines is faster than splitting the code into lines
+_LONG_LINE_LENGTH = 160
+
+
+def _max_line_length(code: str) -> int:
+    """
+    Get the length of the longest line of the code without creating the lines.
+
+    Parameters
+    ----------
+    code : str
+        The code to get the longest line of.
+
+    Returns
+    -------
+    int
+        The length of the longest line.
+    """
+    max_length = 0
+    start = 0
+    end = code.find("\n")
+    while end >= 0:
+        if end - start > max_length:
+            max_length = end - start
+        start = end + 1
+        end = code.find("\n", start)
+    return max(max_length, len(code) - start)
+
+
+@lru_cache(maxsize=256)
+def _code_size(code: str, width_padding: int, height_padding: int) -> Tuple[int, int]:
+    """
+    Get the size of a code block, cached as the same code is often sized again when a row is rebuilt.
+
+    Parameters
+    ----------
+    code : str
+        The code block to get the size of.
+    width_padding : int
+        The padding to add to the width.
+    height_padding : int
+        The padding to add to the height.
+
+    Returns
+    -------
+    Tuple[int, int]
+        The width and height of the code block.
+    """
+    # A single line needs no splitting, its length is the width
+    if "\n" not in code:
+        return len(code) * 10 + width_padding, 20 + height_padding
+
+    line_count = code.count("\n") + 1
+    if len(code) // line_count > _LONG_LINE_LENGTH:
+        max_line_length = _max_line_length(code)
+    else:
+        max_line_length = max(map(len, code.split("\n")))
+    width = max_line_length * 10 + width_padding
+    height = line_count * 20 + height_padding
+    return width, height
+
+
+# The kind, language and content of a block in a TextCodeRow
+BlockKey = Tuple[str, str, str]
+
+# Maps element types to the function that gets their text, None means the element is skipped
+ElementHandlers = Dict[type, Optional[Callable[[Any], str]]]
+
+
+def _code_editor_markdown(element: pn.widgets.CodeEditor) -> str:
+    """
+    Get the code of a code editor as a markdown code block.
+    """
+    return f"```{element.language}\n{element.value}\n```"
+
+
+def _get_handler(handlers: ElementHandlers, element: Any) -> Optional[Callable[[Any], str]]:
+    """
+    Get the handler for an element from a dictionary of handlers.
+
+    The handler of the closest class in the element's MRO is used, and the result is stored under the element's type so
+    the next lookup for that type is a single dictionary access.
+
+    Parameters
+    ----------
+    handlers : ElementHandlers
+        The handlers keyed by element type.
+    element : Any
+        The element to get the handler for.
+
+    Returns
+    -------
+    Optional[Callable[[Any], str]]
+        The handler, or None if the element should be skipped.
+    """
+    element_type = type(element)
+    try:
+        return handlers[element_type]
+    except KeyError:
+        handler = next((handlers[cls] for cls in element_type.__mro__ if cls in handlers), None)
+        handlers[element_type] = handler
+        return handler
+
+
+_ROW_INFORMATION_HANDLERS: ElementHandlers = {
+    pn.widgets.StaticText: lambda element: element.value,
+    pn.widgets.CodeEditor: _code_editor_markdown,
+    BaseChatElement: lambda element: element.get_information(),
+}
+
+_ROW_TEXT_HANDLERS: ElementHandlers = {
+    pn.widgets.StaticText: lambda element: element.value,
+    pn.widgets.CodeEditor: _code_editor_markdown,
+    BaseChatElement: lambda element: element.get_text(),
+}
+
+_CODE_BLOCK_INFORMATION_HANDLERS: ElementHandlers = {
+    pn.widgets.StaticText: lambda element: element.value,
+    pn.pane.Alert: lambda element: element.object,
+    pn.pane.JSON: lambda element: element.object,
+    pn.widgets.CodeEditor: _code_editor_markdown,
+    pn.widgets.TextInput: lambda element: "User input: " + element.value,
+    BaseChatElement: lambda element: element.get_information(),
+    pn.widgets.Button: None,
+    object: lambda element: "Generated figure of type: " + str(type(element)),
+}
+
+_CODE_BLOCK_TEXT_HANDLERS: ElementHandlers = {
+    pn.widgets.StaticText: lambda element: element.value,
+    pn.pane.Alert: lambda element: element.object,
+    pn.pane.JSON: lambda element: element.object,
+    pn.widgets.CodeEditor: _code_editor_markdown,
+    pn.widgets.TextInput: lambda element: element.value,
+    BaseChatElement: lambda element: element.get_text(),
+}
+
 
 class TextCodeRow(BaseChatElement):
     """
@@ -47,37 +244,18 @@ class TextCodeRow(BaseChatElement):
         The code run time object to run the code with.
     """
 
-    width_padding = 5
-    height_padding = 5
-
     def __init__(self, text: str, run_time: BaseCodeRunTime = None) -> None:
+        load_extensions()
         super().__init__()
         self.run_time = run_time
-        self.create_widgets(text)
         self.edit_enabled = False
         self.edit_button = pn.widgets.Button(name="Edit", width=100)
         self.edit_button.on_click(self.enable_editing)
         self.finish_editing_button = pn.widgets.Button(name="Finish Editing", width=100)
         self.finish_editing_button.on_click(self.finish_editing)
-        self.append(self.edit_button)
-
-    def _get_code_size(self, code: str) -> Tuple[int, int]:
-        """
-        Get the size of the code block.
-
-        Parameters
-        ----------
-        code : str
-            The code block to get the size of.
-
-        Returns
-        -------
-        Tuple[int, int]
-            The width and height of the code block.
-        """
-        width = max([len(line) for line in code.split("\n")]) * 10 + self.width_padding
-        height = len(code.split("\n")) * 20 + self.height_padding
-        return width, height
+        # Widgets of the current blocks keyed by (kind, language, content), reused when the row is rebuilt
+        self._block_cache: Dict[BlockKey, pn.viewable.Viewable] = {}
+        self.create_widgets(text)
 
     def _get_code_widget(self, code: str, language: str) -> pn.viewable.Viewable:
         """
@@ -95,17 +273,77 @@ class TextCodeRow(BaseChatElement):
         pn.viewable.Viewable
             The code widget.
         """
-        width, height = self._get_code_size(code)
         if language == "python":
+            # PythonCodeBlock sizes its own editor, so only compute the size here when it is used
             return PythonCodeBlock(code, run_time=self.run_time)
         else:
+            width, height = self._get_code_size(code)
             return pn.widgets.CodeEditor(
                 value=code, language=language, height=height, width=width
             )
 
+    @staticmethod
+    def _widget_content(widget: pn.viewable.Viewable) -> str:
+        """
+        Get the current content of a block widget.
+
+        Parameters
+        ----------
+        widget : pn.viewable.Viewable
+            The text or code widget of a block.
+
+        Returns
+        -------
+        str
+            The text or code the widget currently displays.
+        """
+        if isinstance(widget, PythonCodeBlock):
+            return widget.code_widget.value
+        return widget.value
+
+    def _build_blocks(self, text: str) -> List[Tuple[BlockKey, pn.viewable.Viewable]]:
+        """
+        Build the text and code widgets for the text.
+
+        Widgets of blocks that are already in the block cache are reused instead of being created again.
+
+        Parameters
+        ----------
+        text : str
+            The text to build the widgets from.
+
+        Returns
+        -------
+        List[Tuple[BlockKey, pn.viewable.Viewable]]
+            The key and widget of each block, in display order.
+        """
+        blocks: List[Tuple[BlockKey, pn.viewable.Viewable]] = []
+        used_keys: Set[BlockKey] = set()
+        # Walk the text and code blocks in a single pass over the text
+        for kind, language, content in MarkdownParser.iter_blocks(text):
+            if kind == "text":
+                content = content.strip()
+                if content == "":
+                    continue
+
+            key = (kind, language, content)
+            widget = self._block_cache.get(key)
+            # A widget can only be displayed once, so repeated blocks get a new widget. Editors whose code was edited
+            # since they were created no longer show the block, so they are replaced as well
+            if widget is None or key in used_keys or self._widget_content(widget) != content:
+                if kind == "text":
+                    widget = pn.widgets.StaticText(value=content)
+                else:
+                    widget = self._get_code_widget(content, language)
+            used_keys.add(key)
+            blocks.append((key, widget))
+        return blocks
+
     def create_widgets(self, text: str) -> None:
         """
-        Create the widgets for the row.
+        Create the widgets for the row, followed by the edit button.
+
+        Widgets of blocks that are no longer in the text are dropped from the block cache.
 
         Parameters
         ----------
@@ -113,23 +351,18 @@ class TextCodeRow(BaseChatElement):
             The text to display in the row.
 
         """
+        blocks = self._build_blocks(text)
+        self._block_cache = dict(blocks)
 
-        self.objects = []
-        # Split the text into blocks using ``` as the delimiter
-        blocks = text.split("```")
-        for i, block in enumerate(blocks):
-            # If the block index is even, it's a text block
-            if i % 2 == 0:
-                if block.strip() != "":
-                    self.append(pn.widgets.StaticText(value=block.strip()))
-            else:  # If the block index is odd, it's a code block
-                code = MarkdownParser.get_code_block("```" + block + "```")
-                language = MarkdownParser.get_language("```" + block + "```")
-                self.append(self._get_code_widget(code, language))
+        children: List[pn.viewable.Viewable] = []
+        for _, widget in blocks:
+            # add a divider between each text/code block in the row
+            if children:
+                children.append(pn.layout.Divider())
+            children.append(widget)
 
-        # add a divider between each text/code block in the row
-        for i in range(len(self.objects) - 1):
-            self.insert(i * 2 + 1, pn.layout.Divider())
+        # Assign all the children at once, so Panel sends a single update to the browser
+        self.objects = children + [self.edit_button]
 
     def get_information(self) -> str:
         """
@@ -140,18 +373,7 @@ class TextCodeRow(BaseChatElement):
         str
             The information from the chat element.
         """
-        information = ""
-        for element in self.objects:
-            if isinstance(element, pn.widgets.StaticText):
-                information += "\n\n" + element.value
-            elif isinstance(element, pn.widgets.CodeEditor):
-                language = element.language
-                code = element.value
-                markdown_code = f"```{language}\n{code}\n```"
-                information += "\n\n" + markdown_code
-            elif isinstance(element, BaseChatElement):
-                information += "\n\n" + element.get_information()
-        return information[2:]  # remove the first two new lines
+        return "\n\n".join(self._iter_element_text(_ROW_INFORMATION_HANDLERS))
 
     def get_text(self) -> str:
         """
@@ -159,15 +381,7 @@ class TextCodeRow(BaseChatElement):
         with new lines
         """
 
-        current_text = ""
-        for element in self.objects:
-            if isinstance(element, pn.widgets.StaticText):
-                current_text += element.value + "\n"
-            elif isinstance(element, pn.widgets.CodeEditor):
-                current_text += f"```{element.language}\n{element.value}\n```" + "\n"
-            elif isinstance(element, BaseChatElement):
-                current_text += element.get_text() + "\n"
-        return current_text
+        return "".join(text + "\n" for text in self._iter_element_text(_ROW_TEXT_HANDLERS))
 
     def enable_editing(self, Event: Any = None):
         """
@@ -198,7 +412,6 @@ class TextCodeRow(BaseChatElement):
         if self.edit_enabled:
             current_text = self.objects[0].value
             self.create_widgets(current_text)
-            self.append(self.edit_button)
             self.edit_enabled = False
 
 
@@ -214,10 +427,8 @@ class PythonCodeBlock(BaseChatElement):
         The code run time object to run the code with.
     """
 
-    height_padding = 5
-    width_padding = 5
-
     def __init__(self, code: str, run_time: BaseCodeRunTime = None):
+        load_extensions()
         super().__init__()
         self.code = code
         self.run_time = run_time
@@ -235,6 +446,8 @@ class PythonCodeBlock(BaseChatElement):
         self.append(self.run_button)
         self.run_button.on_click(self.run)
         self.output_start_index = 2
+        # Widgets of the string outputs of the last run keyed by the string, reused when a run gives the same string
+        self._output_index: Dict[str, pn.viewable.Viewable] = {}
 
     def run(self, event):
         """
@@ -251,12 +464,17 @@ class PythonCodeBlock(BaseChatElement):
             self.run_button.name = "No Run Time"
             return
 
-        # Clear previous outputs and save the descriptions in a cache
-        description_cache = {}
-        for i in list(range(self.output_start_index, len(self.objects)))[::-1]:
-            old_widget = self.pop(i)
+        # Save the descriptions keyed by the type of the object and its index among the objects of that type, so
+        # they are restored to the matching output even if the outputs before it changed
+        description_cache: Dict[Tuple[type, int], str] = {}
+        type_counts: Dict[type, int] = {}
+        for old_widget in self.objects[self.output_start_index:]:
             if isinstance(old_widget, PythonObjDescription):
-                description_cache[i] = old_widget.description.value
+                key = self._description_key(old_widget.object, type_counts)
+                description_cache[key] = old_widget.description.value
+
+        # Collect the new outputs and replace the previous ones with a single update
+        new_children: List[pn.viewable.Viewable] = []
         try:
             # Run the code and get the outputs
             outputs = self.run_time.run_code(self.code_widget.value)
@@ -264,43 +482,74 @@ class PythonCodeBlock(BaseChatElement):
             if not isinstance(outputs, tuple):
                 outputs = (outputs,)
 
-            # Display the outputs
+            # Display the outputs. Only the widgets of strings are reused, any other output can be an object the code
+            # changed in place (e.g. one of the variables), so its widget is always created again
+            output_index: Dict[str, pn.viewable.Viewable] = {}
+            type_counts = {}
             for output in outputs:
+                description_key = self._description_key(output, type_counts)
+                widget = None
+                if isinstance(output, str) and output not in output_index:
+                    widget = self._output_index.get(output)
+                if widget is None:
+                    widget = self._get_output_widget(output)
+                    if isinstance(widget, PythonObjDescription) and description_key in description_cache:
+                        widget.set_description(description_cache[description_key])
                 if isinstance(output, str):
-                    self.append(pn.widgets.StaticText(value=output))
-                elif isinstance(output, (dict, list)):
-                    self.append(pn.pane.JSON(output))
-                else:
-                    self.append(PythonObjDescription(output))
+                    output_index.setdefault(output, widget)
+                new_children.append(widget)
+            self._output_index = output_index
 
         except Exception as e:
             # If any error occurs, display the error message
-            self.append(
+            new_children.append(
                 pn.pane.Alert(f"{type(e).__name__}: {str(e)}", alert_type="danger")
             )
 
-        # Add the descriptions back from the cache
-        for i, description in description_cache.items():
-            if isinstance(self.objects[i], PythonObjDescription):
-                self.objects[i].set_description(description)
+        self.objects = self.objects[:self.output_start_index] + new_children
 
-    def _get_code_size(self, code: str):
+    @staticmethod
+    def _description_key(output: Any, type_counts: Dict[type, int]) -> Tuple[type, int]:
         """
-        Get the size of the code block.
+        Get the key of an output's description, its type and its index among the outputs of that type.
 
         Parameters
         ----------
-        code : str
-            The code block to get the size of.
+        output : Any
+            The output the description belongs to.
+        type_counts : Dict[type, int]
+            The number of outputs seen so far for each type, updated with the output.
 
         Returns
         -------
-        Tuple[int, int]
-            The width and height of the code block.
+        Tuple[type, int]
+            The key of the description.
+        """
+        output_type = type(output)
+        index = type_counts.get(output_type, 0)
+        type_counts[output_type] = index + 1
+        return output_type, index
+
+    def _get_output_widget(self, output: Any) -> pn.viewable.Viewable:
+        """
+        Get the widget to display an output of the code.
+
+        Parameters
+        ----------
+        output : Any
+            The output of the code.
+
+        Returns
+        -------
+        pn.viewable.Viewable
+            The widget to display the output.
         """
-        width = max([len(line) for line in code.split("\n")]) * 10 + self.width_padding
-        height = len(code.split("\n")) * 20 + self.height_padding
-        return width, height
+        if isinstance(output, str):
+            return pn.widgets.StaticText(value=output)
+        elif isinstance(output, (dict, list)):
+            return pn.pane.JSON(output)
+        else:
+            return PythonObjDescription(output)
 
     def get_information(self) -> str:
         """
@@ -311,27 +560,7 @@ class PythonCodeBlock(BaseChatElement):
         str
             The information from the chat element.
         """
-        information = ""
-        for element in self.objects:
-            if isinstance(element, pn.widgets.StaticText):
-                information += "\n" + element.value
-            elif isinstance(element, (pn.pane.Alert, pn.pane.JSON)):
-                information += "\n" + element.object
-            elif isinstance(element, pn.widgets.CodeEditor):
-                language = element.language
-                code = element.value
-                markdown_code = f"```{language}\n{code}\n```"
-                information += "\n" + markdown_code
-            elif isinstance(element, pn.widgets.TextInput):
-                information += "\nUser input: " + element.value
-            elif isinstance(element, BaseChatElement):
-                information += "\n" + element.get_information()
-            elif isinstance(element, pn.widgets.Button):
-                continue
-            else:
-                information += "\n" + "Generated figure of type: " + str(type(element))
-
-        return information[1:]  # remove the first new line
+        return "\n".join(self._iter_element_text(_CODE_BLOCK_INFORMATION_HANDLERS))
 
     def get_text(self) -> str:
         """
@@ -339,23 +568,7 @@ class PythonCodeBlock(BaseChatElement):
         with new lines
         """
 
-        current_text = ""
-        for element in self.objects:
-            if isinstance(element, pn.widgets.StaticText):
-                current_text += element.value + "\n"
-            elif isinstance(element, (pn.pane.Alert, pn.pane.JSON)):
-                current_text += element.object + "\n"
-            elif isinstance(element, pn.widgets.CodeEditor):
-                current_text += f"```{element.language}\n{element.value}\n```" + "\n"
-            elif isinstance(element, pn.widgets.TextInput):
-                current_text += element.value + "\n"
-            elif isinstance(element, BaseChatElement):
-                current_text += element.get_text() + "\n"
-            elif isinstance(element, pn.widgets.Button):
-                continue
-            else:
-                pass
-        return current_text
+        return "".join(text + "\n" for text in self._iter_element_text(_CODE_BLOCK_TEXT_HANDLERS))
 
 
 class PythonObjDescription(BaseChatElement):
@@ -398,10 +611,10 @@ class PythonObjDescription(BaseChatElement):
         str
             The information from the chat element.
         """
-        information = "Generate figure of type: " + str(type(self.object))
+        information = ["Generate figure of type: " + str(type(self.object))]
         if self.description.value != "":
-            information += "\nUser description: " + self.description.value
-        return information
+            information.append("User description: " + self.description.value)
+        return "\n".join(information)
 
     def get_description(self) -> str:
         """
@@ -449,7 +662,6 @@ class PythonObjDescription(BaseChatElement):
         with new lines
         """
 
-        current_text = ""
         if self.description.value != "":
-            current_text += self.description.value + "\n"
-        return current_text
+            return self.description.value + "\n"
+        return ""
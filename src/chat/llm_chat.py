@@ -1,5 +1,5 @@
-import re
-from typing import Any
+import time
+from typing import Any, List, Optional
 
 import panel as pn
 import param
@@ -9,7 +9,7 @@ from langchain.llms import BaseLLM, OpenAI
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 
-from chat.chat_elements import TextCodeRow
+from chat.chat_elements import TextCodeRow, load_extensions
 from prompts import BasePromptTemplateCreator
 from run_time import BaseCodeRunTime
 
@@ -28,15 +28,24 @@ class StreamHandler(BaseCallbackHandler):
         The initial text to be displayed in the chat box.
     target_attr : str, optional
         The attribute of the container where the AI's responses will be displayed.
+    flush_interval : float, optional
+        The minimum number of seconds between updates of the displayed text, tokens received in between are shown with
+        the next update.
 
     """
 
     def __init__(self, container: pn.widgets.ChatBox,
                  initial_text: str = "",
-                 target_attr: str = "value"):
+                 target_attr: str = "value",
+                 flush_interval: float = 0.05):
         self.container = container
-        self.text = initial_text
+        # The received text, joined into a single string only when it is displayed
+        self._parts: List[str] = [initial_text] if initial_text else []
         self.target_attr = target_attr
+        self.flush_interval = flush_interval
+        # The pane displaying the response, added to the container on the first flush and then updated in place
+        self.pane: Optional[pn.pane.Markdown] = None
+        self._last_flush = 0.0
 
     def on_llm_new_token(self, token: str, **kwargs) -> None:
         """
@@ -47,8 +56,35 @@ class StreamHandler(BaseCallbackHandler):
         token : str
             The new token received from the language model.
         """
-        self.text += token
-        self.container.replace(-1, {"AI": [self.text]})
+        self._parts.append(token)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def on_llm_end(self, response: Any, **kwargs) -> None:
+        """
+        Callback function for the end of the language model's response, displays the tokens not shown yet.
+
+        Parameters
+        ----------
+        response : langchain.schema.LLMResult
+            The response of the language model. Not used.
+        """
+        self.flush()
+
+    def flush(self) -> None:
+        """
+        Display the text received so far.
+        """
+        # Join the received tokens and keep the joined text as the only part, so the next flush only joins the new
+        # tokens to it
+        text = "".join(self._parts)
+        self._parts = [text]
+        if self.pane is None:
+            self.pane = pn.pane.Markdown(text)
+            self.container.replace(-1, {"AI": [self.pane]})
+        else:
+            self.pane.object = text
+        self._last_flush = time.monotonic()
 
 
 class LLMConversation(param.Parameterized):
@@ -85,7 +121,10 @@ class LLMConversation(param.Parameterized):
         if prompt_template_creator:
             self._chain.prompt = self.prompt_template_creator.get_prompt()
 
-        self._spinner = pn.indicators.LoadingSpinner(value=True, width=18, height=18)
+        # Load the extensions of the chat elements now, so they are part of the page when the chat box is served
+        load_extensions()
+        # The loading spinner is created on the first response and reused for every response after it
+        self._spinner: Optional[pn.indicators.LoadingSpinner] = None
         self.chat_box = pn.widgets.ChatBox()
         self.chat_box.param.watch(self._chat, "value")
 
@@ -115,11 +154,13 @@ class LLMConversation(param.Parameterized):
                 self.chat_box.disabled = False  # Enable the chat box when the function is done
         return inner
 
-    @_disable_inputs # ignore: E0213
     async def _chat(self, event: Any) -> None:
         """
         Handle a chat event.
 
+        The chat box's value also changes while the AI responds (the spinner, the streamed tokens and hiding or showing
+        the history), those changes are ignored here without disabling and enabling the chat box.
+
         Parameters
         ----------
         event : pn.io.events.Event
@@ -127,11 +168,27 @@ class LLMConversation(param.Parameterized):
         """
         user_message = event.new[-1]
         input = user_message.get("You")
-        if input is None:
-            return  # If there's no input (e.g., the message was from the AI), do nothing
+        # Only a new message typed by the user is a string, the user row is replaced by a TextCodeRow once it is
+        # handled, which changes the value again
+        if not isinstance(input, str):
+            return  # If there's no new input (e.g., the message was from the AI), do nothing
+        await self._respond(input)
+
+    @_disable_inputs # ignore: E0213
+    async def _respond(self, input: str) -> None:
+        """
+        Respond to a new user message.
+
+        Parameters
+        ----------
+        input : str
+            The user message.
+        """
         self.user_row_to_TextCodeRow(input)  # convert the user row to a TextCodeRow
         # Update the conversation chain's memory
         self.update_memory()
+        if self._spinner is None:
+            self._spinner = pn.indicators.LoadingSpinner(value=True, width=18, height=18)
         self.chat_box.append({"AI": self._spinner})  # Show the loading spinner while the AI is generating a response
         self._hide_history()  # Hide the chat history when the AI is generating a response
 
@@ -211,10 +268,19 @@ class LLMConversation(param.Parameterized):
             return  # If the last message is not from the AI, do nothing
 
         last_message_text = last_message["AI"][0]
+        # Streamed responses are displayed in a Markdown pane, get the text from it
+        if isinstance(last_message_text, pn.pane.Markdown):
+            last_message_text = last_message_text.object
         # chech if the last message is a text:
         if not isinstance(last_message_text, str):
             return  # If the last message is not a string, do nothing
 
+        # Without code blocks there is nothing to run, so display the text as markdown and skip the TextCodeRow
+        if "```" not in last_message_text:
+            self.chat_box.replace(len(self.chat_box) - 1,
+                                  {'AI': pn.pane.Markdown(last_message_text)})
+            return
+
         self.chat_box.replace(len(self.chat_box) - 1,
                                 {'AI': TextCodeRow(last_message_text, self.run_time)})
 
@@ -236,7 +302,12 @@ class LLMConversation(param.Parameterized):
             if row.get("You", False):
                 history.append(HumanMessage(content=row["You"].get_information()))
             elif row.get("AI", False):
-                history.append(AIMessage(content=row["AI"].get_information()))
+                message = row["AI"]
+                # Replies without code are displayed as markdown instead of a TextCodeRow
+                if isinstance(message, pn.pane.Markdown):
+                    history.append(AIMessage(content=message.object))
+                else:
+                    history.append(AIMessage(content=message.get_information()))
 
         self._chain.memory.chat_memory.messages = history
 
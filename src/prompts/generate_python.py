@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Tuple
 
 from langchain import PromptTemplate
 
@@ -61,6 +61,9 @@ Answer the following: {input}"""
         self.libraries = libraries
         self.tables = tables
         self.function_name = function_name
+        # The last created PromptTemplate and the (libraries, tables, function_name) it was created from
+        self._cached_prompt: Optional[PromptTemplate] = None
+        self._cached_key: Optional[Tuple[str, str, str]] = None
 
     def _create_prompt_template(self) -> PromptTemplate:
         """Creates a new PromptTemplate based on current libraries and tables.
@@ -102,9 +105,16 @@ Answer the following: {input}"""
     def get_prompt(self) -> PromptTemplate:
         """Returns an updated prompt template.
 
+        The PromptTemplate is only created again when the libraries, tables or function name changed since the last
+        call.
+
         Returns
         -------
         PromptTemplate
             An updated PromptTemplate based on current libraries and tables.
         """
-        return self._create_prompt_template()
+        key = (self.libraries, self.tables, self.function_name)
+        if self._cached_prompt is None or key != self._cached_key:
+            self._cached_prompt = self._create_prompt_template()
+            self._cached_key = key
+        return self._cached_prompt
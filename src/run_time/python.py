@@ -1,8 +1,10 @@
 import ast
+import builtins
 import re
-from typing import Callable, Dict, List
-
-import param
+from collections import OrderedDict
+from threading import Lock
+from types import CodeType, FunctionType, MappingProxyType
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from run_time import BaseCodeRunTime
 
@@ -13,6 +15,42 @@ class PythonValidatorError(Exception):
     pass
 
 
+def _is_plain_function_def(tree: ast.Module, function_name: str) -> bool:
+    """
+    Check if the code only defines the function, without decorators, default values or annotations.
+
+    Executing such a ``def`` statement only creates the function from its code object and binds it to its name.
+
+    Parameters
+    ----------
+    tree : ast.Module
+        The syntax tree of the code.
+    function_name : str
+        The name of the function.
+
+    Returns
+    -------
+    bool
+        True if the code only defines the function.
+    """
+    if len(tree.body) != 1:
+        return False
+    node = tree.body[0]
+    if not isinstance(node, ast.FunctionDef) or node.name != function_name:
+        return False
+    if node.decorator_list or node.returns or getattr(node, "type_params", None):
+        return False
+    args = node.args
+    if args.defaults or any(default is not None for default in args.kw_defaults):
+        return False
+    all_args = args.posonlyargs + args.args + args.kwonlyargs + [args.vararg, args.kwarg]
+    return all(arg is None or arg.annotation is None for arg in all_args)
+
+
+# The namespaces created by each block of import statements, shared by the run times that use the same imports
+_NS_CACHE: Dict[str, dict] = {}
+
+
 class PythonCodeRunTime(BaseCodeRunTime):
     """
     Python Code Runtime class for running python code dynamically
@@ -29,6 +67,9 @@ class PythonCodeRunTime(BaseCodeRunTime):
         A PythonValidator object to validate the code before running
     """
 
+    # The number of compiled code blocks kept, the least recently run block is dropped first
+    code_cache_size = 128
+
     def __init__(
         self,
         imports: str,
@@ -40,19 +81,30 @@ class PythonCodeRunTime(BaseCodeRunTime):
         self.variables = variables
         self.function_name = function_name
         self.validator = validator
-        self.namespace: dict = {}
-
-        # Execute the import statements
-        exec(self.imports, self.namespace)
+        # The code blocks that passed the validation keyed by (code, function_name), so a block that is run again is
+        # not validated and compiled again. Blocks that only define the function store the function itself, other
+        # blocks store their code object, which is executed again on every run. The lock keeps the cache consistent
+        # when the run time is used from several threads
+        self._function_cache: "OrderedDict[Tuple[str, str], Union[Callable, CodeType]]" = OrderedDict()
+        self._function_cache_lock = Lock()
+
+        # Execute the import statements, only the first time these imports are used
+        base_namespace = _NS_CACHE.get(self.imports)
+        if base_namespace is None:
+            base_namespace = {}
+            exec(self.imports, base_namespace)
+            _NS_CACHE[self.imports] = base_namespace
+        self.namespace: dict = base_namespace.copy()
 
         # Add the variables to the namespace
-        for key, value in self.variables.items():
-            self.namespace[key] = value
+        self.namespace.update(self.variables)
 
     def _compile_function(self, code: str, function_name: str):
         """
         Compile a Python function from a code block.
 
+        The code is compiled with ``optimize=2``, so ``assert`` statements and docstrings are removed from it.
+
         Parameters
         ----------
         code : str
@@ -65,15 +117,86 @@ class PythonCodeRunTime(BaseCodeRunTime):
         Callable
             The compiled function.
         """
-        # Validate the code if a validator was provided
+        key = (code, function_name)
+        with self._function_cache_lock:
+            compiled = self._function_cache.get(key)
+            if compiled is not None:
+                self._function_cache.move_to_end(key)
+
+        if compiled is None:
+            # Validate the code if a validator was provided, and compile the syntax tree it parsed instead of parsing
+            # the code again
+            tree = self.validator.validate(code) if self.validator else ast.parse(code)
+            code_obj = compile(tree, "<string>", "exec", optimize=2)
+            # A function created without executing the code has no top-level state, so it can be reused by later
+            # runs. Any other code is executed again on every run, so its top-level statements run every time
+            compiled = self._create_function(tree, code_obj, function_name, self._run_namespace())
+            if compiled is None:
+                compiled = code_obj
+
+            with self._function_cache_lock:
+                self._function_cache[key] = compiled
+                if len(self._function_cache) > self.code_cache_size:
+                    self._function_cache.popitem(last=False)
+
+        if isinstance(compiled, CodeType):
+            run_namespace = self._run_namespace()
+            exec(compiled, run_namespace)
+            function = run_namespace[function_name]
+        else:
+            function = compiled
+
+        # Return the function
+        return function
+
+    def _run_namespace(self) -> dict:
+        """
+        Create the namespace to run a code block in, a copy of the namespace so the definitions of other code blocks
+        do not accumulate in it.
+
+        Returns
+        -------
+        dict
+            The namespace to run the code block in.
+        """
+        run_namespace = dict(self.namespace)
         if self.validator:
-            self.validator.validate(code)
+            # Run the validated code with the builtins the validator allows, copied so a run can not change them for
+            # the runs after it
+            run_namespace["__builtins__"] = dict(self.validator.builtins)
+        return run_namespace
+
+    @staticmethod
+    def _create_function(
+        tree: ast.Module, code_obj: CodeType, function_name: str, namespace: dict
+    ) -> Optional[Callable]:
+        """
+        Create the function directly from its code object when the code only defines it.
 
-        # Compile the code
-        exec(code, self.namespace)
+        Parameters
+        ----------
+        tree : ast.Module
+            The syntax tree of the code.
+        code_obj : CodeType
+            The compiled code.
+        function_name : str
+            The name of the function.
+        namespace : dict
+            The global namespace of the function, the function is added to it as the ``def`` statement would.
 
-        # Return the function
-        return self.namespace[function_name]
+        Returns
+        -------
+        Callable, optional
+            The function, or None if the code has to be executed to create it.
+        """
+        if not _is_plain_function_def(tree, function_name):
+            return None
+        for const in code_obj.co_consts:
+            if isinstance(const, CodeType) and const.co_name == function_name:
+                function = FunctionType(const, namespace, function_name)
+                namespace[function_name] = function
+                return function
+        return None
 
     def run_code(self, code: str):
         """
@@ -118,6 +241,20 @@ class PythonValidator:
         Whether to check for usage of exec or eval. Default is True.
     """
 
+    __slots__ = (
+        "check_imports",
+        "check_links",
+        "check_save_funcs",
+        "check_exec_eval",
+        "save_funcs",
+        "_save_names",
+        "_save_prefixes",
+        "_exec_eval_names",
+        "_names_re",
+        "_link_re",
+        "builtins",
+    )
+
     def __init__(
         self,
         check_imports: bool = True,
@@ -131,8 +268,33 @@ class PythonValidator:
         self.check_exec_eval = check_exec_eval
         # Functions that might be used to save data
         self.save_funcs = ["open", "write", "save", "dump"]
-
-    def validate(self, code: str):
+        # The names looked up while walking the syntax tree, built once instead of on every validation
+        self._save_names = frozenset(self.save_funcs)
+        self._save_prefixes = tuple(self.save_funcs)
+        self._exec_eval_names = frozenset({"exec", "eval"})
+        # Matches any of the names in a single scan of the raw code, the names only need to be checked in the syntax
+        # tree when one of them appears in the code
+        self._names_re = re.compile(
+            "|".join(map(re.escape, sorted(self._save_names | self._exec_eval_names)))
+        )
+        # The pattern of the links, compiled once for all validations. With re.ASCII only ASCII whitespace ends a link,
+        # which spares the Unicode lookups of \S and can only match more links
+        self._link_re = re.compile(r"https?://\S+|www\.\S+", re.ASCII)
+        # The builtins for the validated code, without the functions the checks keep it from using. This only removes
+        # the direct names, it is not a sandbox: the full builtins are still reachable, e.g. through the __builtins__ of
+        # an imported module
+        removed_builtins = set()
+        if check_imports:
+            removed_builtins.add("__import__")
+        if check_save_funcs:
+            removed_builtins.add("open")
+        if check_exec_eval:
+            removed_builtins.update(("exec", "eval", "compile"))
+        self.builtins = MappingProxyType(
+            {name: value for name, value in vars(builtins).items() if name not in removed_builtins}
+        )
+
+    def validate(self, code: str) -> ast.Module:
         """
         Validate a Python code.
 
@@ -141,42 +303,65 @@ class PythonValidator:
         code : str
             The Python code to validate.
 
+        Returns
+        -------
+        ast.Module
+            The syntax tree of the code, which can be compiled without parsing the code again.
+
         Raises
         ------
         PythonValidatorError
             If any of the validation checks fail.
         """
-        if self.check_imports:
-            if any(
-                isinstance(node, ast.Import) or isinstance(node, ast.ImportFrom)
-                for node in ast.walk(ast.parse(code))
-            ):
-                raise PythonValidatorError(
-                    "The code contains import statements, which are not allowed. \
-                        Only use the libraries provided in the prompt and do not import any other libraries."
-                )
-
+        # Check the links on the raw code first, so code with links is rejected without being parsed
         if self.check_links:
-            if re.search(r"https?://\S+|www\.\S+", code):
+            if self._link_re.search(code):
                 raise PythonValidatorError(
                     "The code contains links, which are not allowed. \
                         Please remove the links from the code or change the PythonValidator configuration."
                 )
 
-        if self.check_save_funcs:
-            if any(func in code for func in self.save_funcs):
-                raise PythonValidatorError(
-                    "The code contains functions that might be used to save data, which are not allowed.\
+        # Parse the code once and check the imports and the used names in a single walk over the syntax tree
+        tree = ast.parse(code)
+        # Both kinds of import statements contain the import keyword, without it there is no import to look for
+        check_imports = self.check_imports and "import" in code
+        # The attributes used for every node of the walk are bound to local variables
+        check_save_funcs, check_exec_eval = self.check_save_funcs, self.check_exec_eval
+        save_names, save_prefixes, exec_eval_names = self._save_names, self._save_prefixes, self._exec_eval_names
+        check_names = (check_save_funcs or check_exec_eval) and self._names_re.search(code) is not None
+        if check_imports or check_names:
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.Import, ast.ImportFrom)):
+                    if check_imports:
+                        raise PythonValidatorError(
+                            "The code contains import statements, which are not allowed. \
+                        Only use the libraries provided in the prompt and do not import any other libraries."
+                        )
+                    continue
+                if not check_names:
+                    continue
+                # Names are used either directly (open(...)) or as attributes (file.write(...))
+                if isinstance(node, ast.Name):
+                    name = node.id
+                    is_save_func = name in save_names
+                elif isinstance(node, ast.Attribute):
+                    name = node.attr
+                    # Libraries name their save methods after these functions (write_html, savefig, savetxt, dump_json),
+                    # so attributes are matched by prefix, while variables such as writer are still allowed
+                    is_save_func = name.startswith(save_prefixes)
+                else:
+                    continue
+                if check_save_funcs and is_save_func:
+                    raise PythonValidatorError(
+                        "The code contains functions that might be used to save data, which are not allowed.\
                         Please remove or rename the functions in code to something other than {}.".format(
-                        self.save_funcs
+                            self.save_funcs
+                        )
                     )
-                )
-
-        if self.check_exec_eval:
-            if "exec" in code or "eval" in code:
-                raise PythonValidatorError(
-                    "The code contains usage of exec or eval, which are not allowed.\
+                if check_exec_eval and name in exec_eval_names:
+                    raise PythonValidatorError(
+                        "The code contains usage of exec or eval, which are not allowed.\
                                             Please remove the usage of exec or eval from the code."
-                )
+                    )
 
-        return True
+        return tree
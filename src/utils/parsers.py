@@ -1,4 +1,26 @@
 import re
+from typing import Dict, Iterator, Tuple
+
+# Compiled code block patterns keyed by language, a new pattern is only compiled the first time a language is seen
+_CODE_RE_CACHE: Dict[str, re.Pattern] = {}
+
+
+def _is_word(text: str) -> bool:
+    """
+    Check if a text is a single word, the same as a full match of the regex \\w+ without going through the re module.
+    """
+    # Underscores are word characters but are not alphanumeric, so swap them for a letter before checking
+    return text.replace("_", "a").isalnum()
+
+
+def _code_re(language: str) -> re.Pattern:
+    """
+    Get the compiled pattern matching a code block of the given language.
+    """
+    pattern = _CODE_RE_CACHE.get(language)
+    if pattern is None:
+        pattern = _CODE_RE_CACHE[language] = re.compile(f"```{re.escape(language)}(.*?)```", re.DOTALL)
+    return pattern
 
 
 class MarkdownParser:
@@ -24,13 +46,11 @@ class MarkdownParser:
         str
             Extracted code. Returns an empty string if no code is found.
         """
-        if language is '':
+        if language == '':
             language = cls.get_language(markdown_text)
 
-        pattern = f"```{language}(.*?)```"
-
-        matches = re.findall(pattern, markdown_text, re.DOTALL | re.MULTILINE)
-        return matches[0].strip() if matches else ""
+        match = _code_re(language).search(markdown_text)
+        return match.group(1).strip() if match else ""
 
     @classmethod
     def get_language(cls, markdown_text: str) -> str:
@@ -47,9 +67,17 @@ class MarkdownParser:
         str
             Detected programming language. Returns an empty string if no language is detected.
         """
-        pattern = r"```(\w+)\n"
-        match = re.search(pattern, markdown_text)
-        return match.group(1) if match else ""
+        # Check each ``` in turn, the language is the first word that fills the rest of the line after one
+        fence = markdown_text.find("```")
+        while fence >= 0:
+            newline = markdown_text.find("\n", fence + 3)
+            if newline < 0:
+                return ""
+            token = markdown_text[fence + 3:newline]
+            if _is_word(token):
+                return token
+            fence = markdown_text.find("```", fence + 1)
+        return ""
 
     @classmethod
     def get_result(cls, markdown_text: str) -> dict:
@@ -66,6 +94,56 @@ class MarkdownParser:
         dict
             Dictionary with the keys 'code' and 'language'.
         """
-        code = cls.get_code_block(markdown_text)
-        language = cls.get_language(markdown_text)
-        return {"code": code, "language": language}
+        # Walk the blocks once, the result is the first code block with a language or else the first code block
+        result = None
+        for kind, language, code in cls.iter_blocks(markdown_text):
+            if kind != "code":
+                continue
+            if language:
+                return {"code": code, "language": language}
+            if result is None:
+                result = {"code": code, "language": language}
+        return result if result is not None else {"code": "", "language": ""}
+
+    @classmethod
+    def iter_blocks(cls, markdown_text: str) -> Iterator[Tuple[str, str, str]]:
+        """
+        Iterate over the text and code blocks of a markdown string in a single pass.
+
+        The text is split on ``` the same way ``str.split`` would, so an unclosed code block runs until the end of the
+        text. The language of a code block is read from the word directly after its opening ```. Fences are found with
+        ``str.find``, no regex is used.
+
+        Parameters
+        ----------
+        markdown_text : str
+            Markdown text with code enclosed in ```language and ```.
+
+        Yields
+        ------
+        Tuple[str, str, str]
+            The kind of the block ('text' or 'code'), its language (empty for text blocks) and its content. Code
+            content is stripped, text content is returned as is.
+        """
+        length = len(markdown_text)
+        position = 0
+        while position <= length:
+            start = markdown_text.find("```", position)
+            if start < 0:
+                yield "text", "", markdown_text[position:]
+                return
+            yield "text", "", markdown_text[position:start]
+
+            start += 3
+            end = markdown_text.find("```", start)
+            if end < 0:
+                end = length
+            # The language is the word between the opening ``` and the end of its line
+            language = ""
+            newline = markdown_text.find("\n", start, end)
+            if newline >= 0:
+                token = markdown_text[start:newline]
+                if _is_word(token):
+                    language = token
+            yield "code", language, markdown_text[start + len(language):end].strip()
+            position = end + 3
@@ -0,0 +1,34 @@
+import pytest
+
+from run_time.python import PythonValidator, PythonValidatorError
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        "open('data.csv', 'w')",
+        "df.to_csv('data.csv').write('x')",
+        "fig.write_html('x.html')",
+        "fig.write_image('x.png')",
+        "plt.savefig('x.png')",
+        "np.savetxt('x.txt', df)",
+        "pickle.dump(df, f)",
+    ],
+)
+def test_save_functions_are_rejected(call):
+    code = f"def eda_function(df):\n    {call}\n    return df"
+    with pytest.raises(PythonValidatorError, match="save data"):
+        PythonValidator().validate(code)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        "evaluation = df.mean()\n    return evaluation",
+        "writer = df.describe()\n    return writer",
+        "saved_rows = len(df)\n    return saved_rows",
+    ],
+)
+def test_names_containing_banned_names_are_allowed(body):
+    code = f"def eda_function(df):\n    {body}"
+    PythonValidator().validate(code)